@@ -0,0 +1,104 @@
+"""Shared fixtures: an in-memory stand-in for the Event Hubs producer client."""
+
+import asyncio
+from collections import defaultdict
+
+import pytest
+
+from vehicle_generator import generator as generator_module
+from vehicle_generator.generator import VehicleEventGenerator
+
+
+class FakeEventHub:
+    """Records every batch the fake producers send.
+
+    The settings control the partitions reported to the generator, how many events fit
+    in one batch, how long a send takes and which sends fail.
+    """
+
+    def __init__(self):
+        self.partition_ids = ["0", "1", "2", "3"]
+        self.max_batch_events = 1000
+        self.send_delay = 0.001
+        self.failing_sends = set()  # 1-based numbers of the send_batch calls that raise
+        self.batches = []
+        self.send_calls = 0
+        self.in_flight = defaultdict(int)
+        self.max_in_flight = defaultdict(int)
+
+    @property
+    def events(self):
+        """(partition_id, EventData) for every event that was sent, in send order."""
+        return [(batch.partition_id, event) for batch in self.batches for event in batch.events]
+
+    def bodies(self):
+        return [event.body_as_json() for _, event in self.events]
+
+
+class FakeBatch:
+    """EventDataBatch stand-in that is full after a fixed number of events."""
+
+    def __init__(self, partition_id, max_events):
+        self.partition_id = partition_id
+        self.max_events = max_events
+        self.events = []
+
+    def add(self, event_data):
+        if len(self.events) >= self.max_events:
+            raise ValueError("EventDataBatch has reached its size limit")
+        self.events.append(event_data)
+
+    def __len__(self):
+        return len(self.events)
+
+
+class FakeProducer:
+    """EventHubProducerClient stand-in backed by a FakeEventHub."""
+
+    def __init__(self, hub):
+        self.hub = hub
+        self.closed = False
+
+    async def get_partition_ids(self):
+        return list(self.hub.partition_ids)
+
+    async def create_batch(self, partition_id=None):
+        return FakeBatch(partition_id, self.hub.max_batch_events)
+
+    async def send_batch(self, batch):
+        hub = self.hub
+        hub.send_calls += 1
+        call = hub.send_calls
+        hub.in_flight[batch.partition_id] += 1
+        hub.max_in_flight[batch.partition_id] = max(hub.max_in_flight[batch.partition_id],
+                                                    hub.in_flight[batch.partition_id])
+        try:
+            await asyncio.sleep(hub.send_delay)
+            if call in hub.failing_sends:
+                raise ConnectionError(f"send {call} failed")
+            hub.batches.append(batch)
+        finally:
+            hub.in_flight[batch.partition_id] -= 1
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def event_hub(monkeypatch):
+    """Route the generator's producer clients to an in-memory FakeEventHub."""
+    hub = FakeEventHub()
+    monkeypatch.setattr(generator_module, "EventHubProducerClient", lambda **kwargs: FakeProducer(hub))
+    monkeypatch.setattr(generator_module, "DefaultAzureCredential", lambda: None)
+    return hub
+
+
+@pytest.fixture
+def make_generator(event_hub):
+    """Factory for started generators with vehicles set up, sending to `event_hub`."""
+    async def make(num_vehicles=40, agency="demo-transit", **kwargs):
+        generator = VehicleEventGenerator("test.servicebus.windows.net", "vehicle-events", **kwargs)
+        await generator.start()
+        generator.setup_vehicles(agency, None, num_vehicles)
+        return generator
+    return make
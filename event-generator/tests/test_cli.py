@@ -0,0 +1,31 @@
+"""Tests for the command-line interface."""
+
+import pytest
+from click.testing import CliRunner
+
+from vehicle_generator import cli as cli_module
+
+
+@pytest.fixture
+def feed_calls(monkeypatch):
+    """Record the arguments the feed command passes to run_feed_async."""
+    calls = []
+
+    async def fake_run_feed_async(**kwargs):
+        calls.append(kwargs)
+
+    monkeypatch.setattr(cli_module, "run_feed_async", fake_run_feed_async)
+    return calls
+
+
+@pytest.mark.parametrize("extra_args, emit_headers", [([], True), (["--no-cloudevents-headers"], False)])
+def test_feed_passes_cloudevents_headers_option(feed_calls, extra_args, emit_headers):
+    result = CliRunner().invoke(cli_module.cli, [
+        "feed", "--agency", "demo-transit", "--vehicles", "10",
+        "--event-hub-namespace", "test.servicebus.windows.net", "--event-hub-name", "vehicle-events",
+        *extra_args,
+    ])
+
+    assert result.exit_code == 0, result.output
+    assert len(feed_calls) == 1
+    assert feed_calls[0]["emit_cloudevents_headers"] is emit_headers
@@ -0,0 +1,296 @@
+"""Tests for building and sending vehicle events."""
+
+import gc
+import logging
+from datetime import datetime, timezone
+
+import orjson
+import pytest
+
+from vehicle_generator.generator import VehicleEventGenerator
+
+from conftest import FakeBatch, FakeEventHub, FakeProducer
+
+
+async def test_sends_one_position_event_per_vehicle(event_hub, make_generator):
+    generator = await make_generator(num_vehicles=40)
+
+    await generator.send_vehicle_events("demo-transit")
+
+    bodies = sorted(event_hub.bodies(), key=lambda body: body["vehicleId"])
+    assert len(bodies) == 40
+    fleet = generator.fleet
+    for i, body in enumerate(bodies):
+        vehicle = generator.vehicles[i]
+        assert body == {
+            "agency": "demo-transit",
+            "routeTag": vehicle.route.tag,
+            "vehicleId": f"vehicle-{i + 1:03d}",
+            "predictable": True,
+            "lat": fleet.lat[i],
+            "lon": fleet.lon[i],
+            "heading": fleet.heading[i],
+            "speedKmHr": vehicle.speed_km_hr,
+            "timestamp": body["timestamp"],
+        }
+    assert len({body["timestamp"] for body in bodies}) == 1
+
+
+async def test_full_batches_are_flushed_and_a_new_batch_started(event_hub, make_generator):
+    event_hub.max_batch_events = 7
+    generator = await make_generator(num_vehicles=100)
+
+    await generator.send_vehicle_events("demo-transit")
+
+    assert all(len(batch) <= 7 for batch in event_hub.batches)
+    assert sorted(body["vehicleId"] for body in event_hub.bodies()) == [
+        f"vehicle-{i:03d}" for i in range(1, 101)
+    ]
+
+
+async def test_unpartitioned_events_are_shared_by_several_senders(event_hub, make_generator):
+    event_hub.partition_ids = []
+    event_hub.max_batch_events = 5
+    generator = await make_generator(num_vehicles=60)
+
+    await generator.send_vehicle_events("demo-transit")
+
+    assert {partition_id for partition_id, _ in event_hub.events} == {None}
+    assert len(event_hub.events) == 60
+    assert len({body["vehicleId"] for body in event_hub.bodies()}) == 60
+    assert event_hub.max_in_flight[None] > 1
+
+
+@pytest.mark.parametrize("send_delay, filled, size_limited, expected", [
+    (0.0, True, False, 250),    # fast full batch: grow by 25%
+    (0.0, False, False, 200),   # fast tail batch says nothing about capacity
+    (0.0, True, True, 200),     # batches cut by the size limit cannot grow either
+    (0.03, True, False, 160),   # slow send: shrink by 20%
+    (0.03, False, False, 160),
+])
+async def test_send_and_tune_adjusts_batch_size(send_delay, filled, size_limited, expected):
+    generator = VehicleEventGenerator("test.servicebus.windows.net", "vehicle-events")
+    generator._target_send_ms = 10.0
+    hub = FakeEventHub()
+    hub.send_delay = send_delay
+
+    await generator._send_and_tune(FakeProducer(hub), FakeBatch(None, 10), filled=filled,
+                                   size_limited=size_limited)
+
+    assert generator._current_batch_size == expected
+    assert len(hub.batches) == 1
+
+
+@pytest.mark.parametrize("start, send_delay, expected", [(4900, 0.0, 5000), (55, 0.03, 50)])
+async def test_send_and_tune_clamps_batch_size(start, send_delay, expected):
+    generator = VehicleEventGenerator("test.servicebus.windows.net", "vehicle-events")
+    generator._target_send_ms = 10.0
+    generator._current_batch_size = start
+    hub = FakeEventHub()
+    hub.send_delay = send_delay
+
+    await generator._send_and_tune(FakeProducer(hub), FakeBatch(None, 10), filled=True,
+                                   size_limited=False)
+
+    assert generator._current_batch_size == expected
+
+
+async def test_cloudevents_ids_are_unique_prefix_and_counter(event_hub, make_generator):
+    generator = await make_generator(num_vehicles=30)
+
+    await generator.send_vehicle_events("demo-transit")
+    await generator.send_vehicle_events("demo-transit")
+
+    ids = [event.properties["ce-id"] for _, event in event_hub.events]
+    assert len(ids) == len(set(ids)) == 60
+    prefixes = {event_id.rsplit("-", 1)[0] for event_id in ids}
+    assert prefixes == {generator._id_prefix}
+    assert sorted(int(event_id.rsplit("-", 1)[1]) for event_id in ids) == list(range(60))
+
+
+async def test_cloudevents_properties_match_the_body(event_hub, make_generator):
+    generator = await make_generator(num_vehicles=10)
+
+    await generator.send_vehicle_events("demo-transit")
+
+    for _, event in event_hub.events:
+        body = event.body_as_json()
+        properties = event.properties
+        assert properties == {
+            "ce-specversion": "1.0",
+            "ce-type": "vehicle.position",
+            "ce-source": "vehicle-generator",
+            "ce-subject": f"demo-transit/{body['vehicleId']}",
+            "ce-datacontenttype": "application/json",
+            "ce-id": properties["ce-id"],
+            "ce-time": body["timestamp"],
+        }
+
+
+async def test_vehicles_are_pinned_to_one_partition(event_hub, make_generator):
+    event_hub.max_batch_events = 6
+    generator = await make_generator(num_vehicles=50)
+
+    for _ in range(3):
+        await generator.send_vehicle_events("demo-transit")
+        generator.advance_vehicles(5.0)
+
+    partitions_by_vehicle = {}
+    for partition_id, event in event_hub.events:
+        partitions_by_vehicle.setdefault(event.body_as_json()["vehicleId"], set()).add(partition_id)
+    assert len(partitions_by_vehicle) == 50
+    for vehicle in generator.vehicles:
+        assert partitions_by_vehicle[vehicle.name] == {event_hub.partition_ids[vehicle.id % 4]}
+    assert {partition_id for partition_id, _ in event_hub.events} == set(event_hub.partition_ids)
+
+
+async def test_vehicles_follow_the_fleet_state(event_hub, make_generator):
+    generator = await make_generator(num_vehicles=20)
+
+    for _ in range(5):
+        generator.advance_vehicles(45.0)
+    await generator.send_vehicle_events("demo-transit")
+
+    bodies = {body["vehicleId"]: body for body in event_hub.bodies()}
+    for i, vehicle in enumerate(generator.vehicles):
+        body = bodies[vehicle.name]
+        assert vehicle.get_current_position() == pytest.approx((body["lat"], body["lon"]), abs=1e-12)
+        assert vehicle.heading == body["heading"]
+        assert vehicle.current_waypoint_index == generator.fleet.wp_idx[i]
+        assert vehicle.distance_km == generator.fleet.distance_km[i]
+
+
+async def test_each_partition_has_at_most_one_send_in_flight(event_hub, make_generator):
+    event_hub.max_batch_events = 3
+    event_hub.send_delay = 0.005
+    generator = await make_generator(num_vehicles=80)
+
+    await generator.send_vehicle_events("demo-transit")
+
+    assert len(event_hub.events) == 80
+    for partition_id in event_hub.partition_ids:
+        batches = [batch for batch in event_hub.batches if batch.partition_id == partition_id]
+        assert len(batches) > 1
+        assert event_hub.max_in_flight[partition_id] == 1
+        # Batches of one partition are sent in the order their events were built
+        vehicle_ids = [event.body_as_json()["vehicleId"] for batch in batches for event in batch.events]
+        assert vehicle_ids == sorted(vehicle_ids)
+
+
+@pytest.mark.parametrize("timestamp, expected", [
+    (1700000000.0, "2023-11-14T22:13:20.000000+00:00"),
+    (1700000000.000001, "2023-11-14T22:13:20.000001+00:00"),
+    (1700000000.123456, "2023-11-14T22:13:20.123456+00:00"),
+    (1700000000.9999996, "2023-11-14T22:13:21.000000+00:00"),  # rounds up into the next second
+])
+def test_format_timestamp(timestamp, expected):
+    generator = VehicleEventGenerator("test.servicebus.windows.net", "vehicle-events")
+
+    assert generator._format_timestamp(timestamp) == expected
+
+
+def test_format_timestamp_refreshes_cached_second():
+    generator = VehicleEventGenerator("test.servicebus.windows.net", "vehicle-events")
+    timestamps = [1700000000.25, 1700000000.75, 1700000001.5, 1700000060.0, 1700000000.5]
+
+    formatted = [generator._format_timestamp(timestamp) for timestamp in timestamps]
+
+    assert formatted == [
+        datetime.fromtimestamp(timestamp, timezone.utc).isoformat(timespec="microseconds")
+        for timestamp in timestamps
+    ]
+
+
+async def test_failed_sender_leaves_shared_queue_to_other_senders(event_hub, make_generator):
+    event_hub.partition_ids = []
+    event_hub.max_batch_events = 5
+    event_hub.failing_sends = {1}
+    generator = await make_generator(num_vehicles=100)
+
+    events_sent = await generator.send_vehicle_events("demo-transit")
+
+    # Only the failed sender's events are lost: the failed batch, the batch it had filled
+    # meanwhile and the event it was about to add
+    assert events_sent == len(event_hub.events)
+    assert events_sent >= 100 - (2 * 5 + 1)
+    assert len({body["vehicleId"] for body in event_hub.bodies()}) == events_sent
+
+
+async def test_failed_partition_send_is_counted_and_retrieved(event_hub, make_generator, caplog):
+    event_hub.max_batch_events = 4
+    event_hub.failing_sends = {2}
+    generator = await make_generator(num_vehicles=80)
+
+    with caplog.at_level(logging.ERROR):
+        events_sent = await generator.send_vehicle_events("demo-transit")
+        gc.collect()
+
+    # 20 vehicles per partition; the partition whose send failed drops the rest of its events
+    assert events_sent == len(event_hub.events)
+    sent_per_partition = [
+        sum(1 for partition_id, _ in event_hub.events if partition_id == partition)
+        for partition in event_hub.partition_ids
+    ]
+    assert sorted(sent_per_partition)[1:] == [20, 20, 20]
+    assert sorted(sent_per_partition)[0] < 20
+    assert "events dropped this tick" in caplog.text
+    assert "exception was never retrieved" not in caplog.text
+
+
+async def test_cloudevents_headers_can_be_turned_off(event_hub, make_generator):
+    generator = await make_generator(num_vehicles=10, emit_cloudevents_headers=False)
+
+    await generator.send_vehicle_events("demo-transit")
+
+    assert len(event_hub.events) == 10
+    assert all(not event.properties for _, event in event_hub.events)
+    assert generator._id_counter == 0
+
+
+def test_event_body_splices_values_onto_the_prefix():
+    generator = VehicleEventGenerator("test.servicebus.windows.net", "vehicle-events")
+    agency = 'demo "transit" \u2713'
+    generator.setup_vehicles(agency, "queens-connector", 3)
+    vehicle = generator.vehicles[2]
+
+    event_data = generator._build_event_sync(2, 40.75, -73.8, 359.5, 31.25,
+                                             "2024-01-15T10:30:00.000000+00:00")
+
+    assert b"".join(event_data.body) == orjson.dumps({
+        "agency": agency,
+        "routeTag": "queens-connector",
+        "vehicleId": vehicle.name,
+        "predictable": True,
+        "lat": 40.75,
+        "lon": -73.8,
+        "heading": 359.5,
+        "speedKmHr": 31.25,
+        "timestamp": "2024-01-15T10:30:00.000000+00:00",
+    })
+
+
+def test_vehicles_get_integer_ids_and_string_names_in_events():
+    generator = VehicleEventGenerator("test.servicebus.windows.net", "vehicle-events")
+    generator.setup_vehicles("demo-transit", None, 12)
+
+    assert [vehicle.id for vehicle in generator.vehicles] == list(range(1, 13))
+    event_data = generator._build_event_sync(4, 40.75, -73.8, 90.0, 30.0, "2024-01-15T10:30:00.000000+00:00")
+    assert orjson.loads(b"".join(event_data.body))["vehicleId"] == "vehicle-005"
+
+
+def test_fleet_snapshot_lines_match_the_event_bodies():
+    generator = VehicleEventGenerator("test.servicebus.windows.net", "vehicle-events")
+    generator.setup_vehicles("demo-transit", None, 15)
+    generator.advance_vehicles(30.0)
+    fleet = generator.fleet
+    # A whole second, so the formatted timestamp ends in ".000000"
+    time_iso = generator._format_timestamp(1700000000.0)
+
+    lines = fleet.snapshot_json(time_iso, "demo-transit").split(b"\n")
+
+    assert len(lines) == 15
+    for i, line in enumerate(lines):
+        event_data = generator._build_event_sync(i, fleet.lat[i].item(), fleet.lon[i].item(),
+                                                 fleet.heading[i].item(), fleet.speed[i].item(), time_iso)
+        assert line == b"".join(event_data.body)
+        assert orjson.loads(line)["timestamp"] == "2023-11-14T22:13:20.000000+00:00"
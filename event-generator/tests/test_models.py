@@ -0,0 +1,354 @@
+"""Tests for vehicle movement along routes."""
+
+import math
+from datetime import datetime, timezone
+
+import numpy as np
+import orjson
+import pytest
+
+from vehicle_generator import models
+from vehicle_generator.models import Fleet, Route, Vehicle, VehiclePosition
+
+
+def make_routes():
+    """A loop, a route with a zero-length segment, and a single straight segment."""
+    return [
+        Route(
+            tag="loop",
+            title="Loop",
+            waypoints=[
+                (40.7580, -73.9855),
+                (40.7614, -73.9776),
+                (40.7505, -73.9934),
+                (40.7484, -73.9857),
+                (40.7580, -73.9855),
+            ],
+        ),
+        Route(
+            tag="pause",
+            title="Pause",
+            waypoints=[
+                (40.7061, -74.0087),
+                (40.7074, -74.0113),
+                (40.7074, -74.0113),
+                (40.7033, -74.0170),
+            ],
+        ),
+        Route(tag="straight", title="Straight", waypoints=[(40.7829, -73.9654), (40.7851, -73.9680)]),
+    ]
+
+
+def make_vehicles(routes, num_vehicles=60, seed=1):
+    rng = np.random.default_rng(seed)
+    vehicles = []
+    for i in range(num_vehicles):
+        route = routes[i % len(routes)]
+        vehicles.append(Vehicle(
+            id=i + 1,
+            route=route,
+            current_waypoint_index=int(rng.integers(0, len(route.waypoints) - 1)),
+            progress_to_next_waypoint=float(rng.uniform(0.0, 1.0)),
+            speed_km_hr=float(rng.uniform(20.0, 40.0)),
+        ))
+    for vehicle in vehicles:
+        vehicle.update_heading()
+    return vehicles
+
+
+# Mix of short ticks, ticks that cross several segments and ticks that wrap the route
+TIME_STEPS = [0.5, 7.0, 60.0, 600.0, 3600.0]
+
+
+def assert_fleet_matches(fleet, vehicles):
+    positions = np.array([vehicle.get_current_position() for vehicle in vehicles])
+    np.testing.assert_allclose(fleet.lat, positions[:, 0], rtol=0, atol=1e-9)
+    np.testing.assert_allclose(fleet.lon, positions[:, 1], rtol=0, atol=1e-9)
+    np.testing.assert_allclose(fleet.distance_km, [v.distance_km for v in vehicles], rtol=0, atol=1e-9)
+    np.testing.assert_array_equal(fleet.wp_idx, [v.current_waypoint_index for v in vehicles])
+    np.testing.assert_allclose(fleet.heading, [v.heading for v in vehicles], rtol=0, atol=1e-9)
+
+
+@pytest.mark.parametrize("use_numba", [True, False])
+def test_fleet_matches_vehicle_advance(monkeypatch, use_numba):
+    if use_numba and not models._HAVE_NUMBA:
+        pytest.skip("numba is not installed")
+    monkeypatch.setattr(models, "_HAVE_NUMBA", use_numba)
+
+    routes = make_routes()
+    vehicles = make_vehicles(routes)
+    fleet = Fleet(routes, vehicles)
+    assert_fleet_matches(fleet, vehicles)
+
+    for step in range(50):
+        time_step = TIME_STEPS[step % len(TIME_STEPS)]
+        fleet.advance_all(time_step)
+        for vehicle in vehicles:
+            vehicle.advance(time_step)
+        assert_fleet_matches(fleet, vehicles)
+
+
+def test_numba_and_numpy_advance_agree(monkeypatch):
+    if not models._HAVE_NUMBA:
+        pytest.skip("numba is not installed")
+
+    routes = make_routes()
+    compiled = Fleet(routes, make_vehicles(routes))
+    vectorized = Fleet(routes, make_vehicles(routes))
+
+    for step in range(50):
+        time_step = TIME_STEPS[step % len(TIME_STEPS)]
+        compiled.advance_all(time_step)
+        with monkeypatch.context() as patch:
+            patch.setattr(models, "_HAVE_NUMBA", False)
+            vectorized.advance_all(time_step)
+
+        for column in ("distance_km", "progress", "lat", "lon", "heading"):
+            np.testing.assert_allclose(getattr(compiled, column), getattr(vectorized, column),
+                                       rtol=0, atol=1e-9, err_msg=column)
+        np.testing.assert_array_equal(compiled.wp_idx, vectorized.wp_idx)
+
+
+def test_zero_length_segment_is_skipped():
+    route = make_routes()[1]
+    vehicle = Vehicle(id=1, route=route, speed_km_hr=36.0)
+    fleet = Fleet([route], [Vehicle(id=1, route=route, speed_km_hr=36.0)])
+
+    # Step in 1 second (10 m) increments across the whole route and around again
+    for _ in range(int(2 * route._total_km * 100) + 1):
+        vehicle.advance(1.0)
+        fleet.advance_all(1.0)
+        assert vehicle.current_waypoint_index != 1
+        assert 0.0 <= vehicle.progress_to_next_waypoint < 1.0
+        assert np.isfinite(fleet.lat).all() and np.isfinite(fleet.lon).all()
+        assert fleet.wp_idx[0] == vehicle.current_waypoint_index
+
+
+@pytest.mark.parametrize("use_numba", [True, False])
+def test_trailing_zero_length_segment_is_never_selected(monkeypatch, use_numba):
+    if use_numba and not models._HAVE_NUMBA:
+        pytest.skip("numba is not installed")
+    monkeypatch.setattr(models, "_HAVE_NUMBA", use_numba)
+
+    # A route ending in a repeated waypoint, placed after another route in the fleet
+    last = (40.68158535541215, -73.99972614998299)
+    route = Route(tag="ends-in-pause", title="Ends in pause", waypoints=[
+        (40.66066357757672, -73.9270503439016),
+        (40.65436249914654, -73.90649275762122),
+        last,
+        last,
+    ])
+    vehicle = Vehicle(id=2, route=route, speed_km_hr=0.0)
+    fleet = Fleet([make_routes()[0], route], [Vehicle(id=2, route=route, speed_km_hr=0.0)])
+
+    # Just short of the end of the route, where rounding used to pick the last segment
+    just_before_end = float(np.nextafter(route._total_km, 0.0))
+    vehicle.distance_km = just_before_end
+    fleet.distance_km[:] = just_before_end
+    vehicle.advance(0.0)
+    fleet.advance_all(0.0)
+
+    assert np.isfinite(fleet.lat).all() and np.isfinite(fleet.lon).all()
+    assert np.isfinite(fleet.progress).all()
+    assert fleet.wp_idx[0] == vehicle.current_waypoint_index == 1
+    assert (fleet.lat[0], fleet.lon[0]) == pytest.approx(vehicle.get_current_position(), abs=1e-12)
+    assert (fleet.lat[0], fleet.lon[0]) == pytest.approx(last, abs=1e-9)
+
+
+def test_advance_wraps_at_end_of_route():
+    route = make_routes()[2]
+    vehicle = Vehicle(id=1, route=route, progress_to_next_waypoint=0.9, speed_km_hr=36.0)
+    fleet = Fleet([route], [Vehicle(id=1, route=route, progress_to_next_waypoint=0.9, speed_km_hr=36.0)])
+    start_km = vehicle.distance_km
+
+    # 36 km/h for 60 s is 0.6 km, which runs past the end of this ~0.32 km route
+    vehicle.advance(60.0)
+    fleet.advance_all(60.0)
+
+    expected_km = (start_km + 0.6) % route._total_km
+    assert vehicle.distance_km == pytest.approx(expected_km, abs=1e-12)
+    assert fleet.distance_km[0] == pytest.approx(expected_km, abs=1e-12)
+    assert vehicle.get_current_position() == pytest.approx((fleet.lat[0], fleet.lon[0]), abs=1e-12)
+
+
+@pytest.mark.parametrize("use_numba", [True, False])
+def test_distance_stays_below_route_length(monkeypatch, use_numba):
+    if use_numba and not models._HAVE_NUMBA:
+        pytest.skip("numba is not installed")
+    monkeypatch.setattr(models, "_HAVE_NUMBA", use_numba)
+
+    routes = make_routes()
+    vehicles = make_vehicles(routes)
+    fleet = Fleet(routes, vehicles)
+    route_km = np.array([vehicle.route._total_km for vehicle in vehicles])
+
+    for step in range(200):
+        time_step = TIME_STEPS[step % len(TIME_STEPS)]
+        fleet.advance_all(time_step)
+        for vehicle in vehicles:
+            vehicle.advance(time_step)
+            assert 0.0 <= vehicle.distance_km < vehicle.route._total_km
+        assert (fleet.distance_km >= 0.0).all()
+        assert (fleet.distance_km < route_km).all()
+
+
+def test_fleet_handles_routes_without_segments():
+    empty = Route(tag="empty", title="Empty", waypoints=[])
+    single = Route(tag="single", title="Single", waypoints=[(40.7, -74.0)])
+    vehicles = [Vehicle(id=1, route=empty), Vehicle(id=2, route=single)]
+    fleet = Fleet([empty, single], vehicles)
+
+    fleet.advance_all(60.0)
+
+    assert list(zip(fleet.lat.tolist(), fleet.lon.tolist())) == [(0.0, 0.0), (40.7, -74.0)]
+    assert [vehicle.get_current_position() for vehicle in vehicles] == [(0.0, 0.0), (40.7, -74.0)]
+
+
+def test_fleet_columns_follow_the_vehicles():
+    routes = make_routes()
+    vehicles = make_vehicles(routes, num_vehicles=7)
+
+    fleet = Fleet(routes, vehicles)
+
+    assert len(fleet) == 7
+    assert fleet.route_id.tolist() == [i % 3 for i in range(7)]
+    assert fleet.wp_idx.tolist() == [v.current_waypoint_index for v in vehicles]
+    assert fleet.progress.tolist() == [v.progress_to_next_waypoint for v in vehicles]
+    assert fleet.speed.tolist() == [v.speed_km_hr for v in vehicles]
+    assert fleet.heading.tolist() == [v.heading for v in vehicles]
+    assert list(zip(fleet.lat.tolist(), fleet.lon.tolist())) == pytest.approx(
+        [v.get_current_position() for v in vehicles], abs=1e-12
+    )
+
+
+def test_empty_fleet():
+    fleet = Fleet([], [])
+
+    fleet.advance_all(60.0)
+
+    assert len(fleet) == 0
+    assert fleet.lat.shape == fleet.lon.shape == fleet.heading.shape == (0,)
+
+
+def test_kernel_is_compiled_by_warm_up_not_on_construction(monkeypatch):
+    calls = []
+    monkeypatch.setattr(models, "_HAVE_NUMBA", True)
+    monkeypatch.setattr(models, "advance_fleet", lambda *args: calls.append(len(args[0])), raising=False)
+    routes = make_routes()
+
+    fleet = Fleet(routes, make_vehicles(routes, num_vehicles=5))
+    Fleet([], [])
+    assert calls == []
+
+    fleet.warm_up()
+    assert calls == [0]
+
+
+def test_route_precomputes_segment_tables():
+    route = make_routes()[0]
+    points = route.waypoints
+
+    assert len(route._seg_km) == len(points) - 1
+    np.testing.assert_allclose(np.diff(route._cum_km), route._seg_km, rtol=1e-12)
+    assert route._cum_km[0] == 0.0
+    assert route._total_km == route._cum_km[-1]
+    for i in range(len(points) - 1):
+        distance, bearing = route._distance_and_bearing(i)
+        assert distance == pytest.approx(route.get_distance_between_points(points[i], points[i + 1]))
+        assert bearing == route._bearings[i]
+
+
+def haversine_km(point1, point2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (*point1, *point2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2 +
+         math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * 6371.0088 * math.asin(math.sqrt(a))
+
+
+def test_cheap_ruler_distance_matches_haversine_for_city_routes():
+    for route in make_routes():
+        for start, end in zip(route.waypoints[:-1], route.waypoints[1:]):
+            assert route.get_distance_between_points(start, end) == pytest.approx(
+                haversine_km(start, end), rel=5e-3, abs=1e-9
+            )
+
+
+@pytest.mark.parametrize("delta, expected", [
+    ((0.01, 0.0), 0.0),
+    ((0.0, 0.01), 90.0),
+    ((-0.01, 0.0), 180.0),
+    ((0.0, -0.01), 270.0),
+])
+def test_segment_headings_are_compass_bearings(delta, expected):
+    start = (40.75, -73.98)
+    route = Route(tag="r", title="R", waypoints=[start, (start[0] + delta[0], start[1] + delta[1])])
+
+    assert route._bearings[0] == pytest.approx(expected, abs=0.01)
+    assert 0.0 <= route._bearings[0] < 360.0
+
+
+def test_vehicle_state_holds_plain_floats():
+    route = make_routes()[0]
+    vehicle = Vehicle(id=1, route=route, current_waypoint_index=1, progress_to_next_waypoint=0.5)
+
+    vehicle.update_heading()
+    assert type(vehicle.heading) is float
+    vehicle.advance(30.0)
+
+    for value in (vehicle.heading, vehicle.progress_to_next_waypoint, vehicle.distance_km,
+                  *vehicle.get_current_position()):
+        assert type(value) is float
+    assert type(vehicle.current_waypoint_index) is int
+
+
+@pytest.mark.parametrize("timestamp_iso", [None, "2024-01-15T10:30:00.000000+00:00"])
+def test_position_json_matches_dict(timestamp_iso):
+    position = VehiclePosition(agency="demo-transit", route_tag="loop", vehicle_id="vehicle-001",
+                               lat=40.75, lon=-73.98, heading=90.0, speed_km_hr=31.5,
+                               timestamp=datetime(2024, 1, 15, 10, 30, tzinfo=timezone.utc))
+
+    document = position.to_dict(timestamp_iso)
+
+    assert orjson.loads(position.to_json(timestamp_iso)) == document
+    assert document["timestamp"] == (timestamp_iso or "2024-01-15T10:30:00+00:00")
+
+
+def test_route_stores_waypoints_as_one_float64_array():
+    points = [(40.7580, -73.9855), (40.7614, -73.9776), (40.7505, -73.9934)]
+
+    from_list = Route(tag="r", title="R", waypoints=points)
+    from_array = Route(tag="r", title="R", waypoints=np.asfortranarray(points, dtype=np.float32))
+
+    for route in (from_list, from_array):
+        assert route.waypoints.dtype == np.float64
+        assert route.waypoints.shape == (3, 2)
+        assert route.waypoints.flags.c_contiguous
+    np.testing.assert_allclose(from_array.waypoints, from_list.waypoints, rtol=1e-6)
+    assert Route(tag="empty", title="Empty", waypoints=[]).waypoints.shape == (0, 2)
+
+
+def test_routes_and_vehicles_compare_without_comparing_arrays():
+    points = [(40.7580, -73.9855), (40.7614, -73.9776)]
+    route = Route(tag="r", title="R", waypoints=points)
+    same_route = Route(tag="r", title="R", waypoints=np.array(points))
+
+    assert route == same_route
+    assert route != Route(tag="other", title="R", waypoints=points)
+    assert Vehicle(id=1, route=route) == Vehicle(id=1, route=same_route)
+    assert Vehicle(id=1, route=route) != Vehicle(id=2, route=route)
+
+
+def test_models_use_slots_and_integer_vehicle_ids():
+    route = make_routes()[0]
+    vehicle = Vehicle(id=7, route=route)
+    position = VehiclePosition(agency="demo-transit", route_tag=route.tag, vehicle_id=vehicle.name,
+                               lat=40.75, lon=-73.98, heading=0.0, speed_km_hr=25.0,
+                               timestamp=datetime(2024, 1, 15, tzinfo=timezone.utc))
+
+    for instance in (route, vehicle, position):
+        assert not hasattr(instance, "__dict__")
+    with pytest.raises(AttributeError):
+        vehicle.colour = "red"
+    assert vehicle.id == 7
+    assert vehicle.name == "vehicle-007"
+    assert Vehicle(id=1234, route=route).name == "vehicle-1234"
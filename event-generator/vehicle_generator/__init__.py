@@ -9,6 +9,6 @@ __author__ = "Azure Dev Summit"
 __email__ = "demo@example.com"
 
 from .generator import VehicleEventGenerator
-from .models import VehiclePosition, Route, Vehicle
+from .models import VehiclePosition, Route, Vehicle, Fleet
 
-__all__ = ["VehicleEventGenerator", "VehiclePosition", "Route", "Vehicle"]
\ No newline at end of file
+__all__ = ["VehicleEventGenerator", "VehiclePosition", "Route", "Vehicle", "Fleet"]
\ No newline at end of file
@@ -4,7 +4,7 @@ import asyncio
 import logging
 import os
 import sys
-from typing import Optional
+from typing import Any, Coroutine, Optional
 
 import click
 from dotenv import load_dotenv
@@ -62,8 +62,10 @@ def cli(verbose: bool):
 @click.option('--event-hub-namespace', envvar='EVENT_HUB_NAMESPACE', help='Event Hub namespace (e.g., mynamespace.servicebus.windows.net)')
 @click.option('--event-hub-name', envvar='EVENT_HUB_NAME', help='Event Hub name')
 @click.option('--high-performance', is_flag=True, help='Enable extreme high-performance mode for thousands of events/sec')
+@click.option('--no-cloudevents-headers', is_flag=True, help='Omit the ce-* CloudEvents application properties from each event')
 def feed(agency: str, route: str, vehicles: int, poll_interval: float, 
-         event_hub_namespace: Optional[str], event_hub_name: Optional[str], high_performance: bool):
+         event_hub_namespace: Optional[str], event_hub_name: Optional[str], high_performance: bool,
+         no_cloudevents_headers: bool):
     """Generate and send vehicle location events to Event Hubs with extreme performance optimization.
     
     This command polls vehicle locations and submits them to an Azure Event Hub instance.
@@ -140,28 +142,32 @@ def feed(agency: str, route: str, vehicles: int, poll_interval: float,
     click.echo(f"  Event Hub Namespace: {event_hub_namespace}")
     click.echo(f"  Authentication: DefaultAzureCredential")
     click.echo(f"  High-Performance Mode: {'✅ ENABLED' if high_performance else '❌ DISABLED'}")
+    click.echo(f"  CloudEvents Headers: {'❌ DISABLED' if no_cloudevents_headers else '✅ ENABLED'}")
     click.echo()
     click.echo("Press Ctrl+C to stop...")
     
     # Run the feed
-    asyncio.run(run_feed_async(
+    _run(run_feed_async(
         event_hub_namespace=event_hub_namespace, 
         event_hub_name=event_hub_name,
         agency=agency, 
         route=route, 
         vehicles=vehicles, 
-        poll_interval=poll_interval
+        poll_interval=poll_interval,
+        emit_cloudevents_headers=not no_cloudevents_headers
     ))
 
 
 async def run_feed_async(event_hub_namespace: str, event_hub_name: str, 
-                        agency: str, route: str, vehicles: int, poll_interval: float):
+                        agency: str, route: str, vehicles: int, poll_interval: float,
+                        emit_cloudevents_headers: bool = True):
     """Run the vehicle feed asynchronously."""
     try:
         # Create generator with DefaultAzureCredential
         generator = VehicleEventGenerator(
             event_hub_namespace=event_hub_namespace,
-            event_hub_name=event_hub_name
+            event_hub_name=event_hub_name,
+            emit_cloudevents_headers=emit_cloudevents_headers
         )
         
         async with generator:
@@ -198,6 +204,16 @@ def routes(agency: str):
         click.echo(f"No routes found for agency: {agency}")
 
 
+def _run(main: Coroutine[Any, Any, None]) -> None:
+    """Run a coroutine on uvloop's faster event loop when the performance extras are installed."""
+    try:
+        import uvloop
+    except ImportError:
+        asyncio.run(main)
+        return
+    uvloop.run(main)
+
+
 def main():
     """Main entry point for the CLI."""
     cli()
@@ -1,18 +1,19 @@
 """Vehicle event generator for Azure Event Hubs."""
 
 import asyncio
-import json
+import itertools
 import logging
+import time
 import uuid
-from datetime import datetime, timezone
-from typing import List, Optional, Dict, Any, Union
+from typing import Iterator, List, Optional, Dict, Any, Union
 
+import numpy as np
+import orjson
 from azure.eventhub.aio import EventHubProducerClient
 from azure.eventhub import EventData
 from azure.identity.aio import DefaultAzureCredential
-from cloudevents.http import CloudEvent
 
-from .models import VehiclePosition, Route, Vehicle
+from .models import Fleet, Route, Vehicle
 
 
 logger = logging.getLogger(__name__)
@@ -21,18 +22,50 @@ logger = logging.getLogger(__name__)
 class VehicleEventGenerator:
     """Generates vehicle location events and sends them to Azure Event Hubs."""
     
-    def __init__(self, event_hub_namespace: str, event_hub_name: str):
+    def __init__(self, event_hub_namespace: str, event_hub_name: str,
+                 emit_cloudevents_headers: bool = True):
         """Initialize the event generator.
         
         Args:
             event_hub_namespace: Azure Event Hubs namespace (e.g., 'mynamespace.servicebus.windows.net')
             event_hub_name: Name of the Event Hub
+            emit_cloudevents_headers: Whether to attach the ce-* CloudEvents application properties
         """
         self.event_hub_namespace = event_hub_namespace
         self.event_hub_name = event_hub_name
+        self._emit_ce_props = emit_cloudevents_headers
         self.producer_client: Optional[EventHubProducerClient] = None
-        self.vehicles: List[Vehicle] = []
+        # Pool of producer clients (one AMQP connection each) that senders rotate through
+        self._producer_pool: List[EventHubProducerClient] = []
+        self._rr: Optional[Iterator[EventHubProducerClient]] = None
+        self.max_producer_pool_size = 8
+        # Partition IDs of the Event Hub; vehicles are pinned to one partition each
+        self._partition_ids: List[str] = []
+        # Distinct target partitions of the current vehicles (None when unknown)
+        self._partition_groups: List[Optional[str]] = []
+        self._vehicles: List[Vehicle] = []
+        # Per-vehicle constant event parts, indexed like self.vehicles and built once in
+        # setup_vehicles: the opening of the JSON body, target partition and ce-* headers
+        self._body_prefixes: List[bytes] = []
+        self._vehicle_partitions: List[Optional[str]] = []
+        self._props_templates: List[Dict[Union[str, bytes], Any]] = []
         self.running = False
+        # Fleet state as NumPy arrays indexed like self.vehicles (structure of arrays)
+        self.fleet = Fleet([], [])
+        # Number of concurrent senders for events without a target partition; each one
+        # fills EventDataBatch objects up to the Event Hubs size limit
+        self.sender_concurrency = 4
+        # Adaptive batch sizing: grow or shrink the events-per-send so that each
+        # send_batch call completes well within the poll interval
+        self._target_send_ms = 125.0
+        self._current_batch_size = 200
+        # ce-id values are a per-run random prefix plus a monotonic counter
+        self._id_prefix = uuid.uuid4().hex
+        self._id_counter = 0
+        # Cached "YYYY-MM-DDTHH:MM:SS" prefix for the current second
+        self._timestamp_second = -1
+        self._timestamp_prefix = ""
+        self._tick_count = 0
         
     async def __aenter__(self):
         """Async context manager entry."""
@@ -51,24 +84,57 @@ class VehicleEventGenerator:
         logger.info("Using DefaultAzureCredential for authentication")
         
         # Configure Event Hub producer for maximum performance
-        self.producer_client = EventHubProducerClient(
+        self.producer_client = self._create_producer_client(credential)
+        
+        # A single producer sends over one connection, which caps client-side throughput.
+        # Open one client per partition (up to the pool limit) and rotate batches across them.
+        self._partition_ids = list(await self.producer_client.get_partition_ids())
+        pool_size = max(1, min(len(self._partition_ids), self.max_producer_pool_size))
+        self._producer_pool = [self.producer_client] + [
+            self._create_producer_client(credential) for _ in range(pool_size - 1)
+        ]
+        self._rr = itertools.cycle(self._producer_pool)
+        self.sender_concurrency = max(self.sender_concurrency, pool_size)
+        
+        # Seed event IDs once per run; a counter is far cheaper than uuid4() per event
+        self._id_prefix = uuid.uuid4().hex
+        self._id_counter = 0
+        
+        logger.info(f"🚀 Started HIGH-PERFORMANCE Event Hub producer for {self.event_hub_name}")
+        logger.info(f"   Namespace: {self.event_hub_namespace}")
+        logger.info(f"   Producer clients: {len(self._producer_pool)}")
+        logger.info(f"   Optimized for extreme throughput")
+        
+    def _create_producer_client(self, credential: DefaultAzureCredential) -> EventHubProducerClient:
+        """Create a producer client for the configured Event Hub."""
+        return EventHubProducerClient(
             fully_qualified_namespace=self.event_hub_namespace,
             eventhub_name=self.event_hub_name,
             credential=credential
             # Note: Removed transport_type parameter as it's not available in current SDK version
         )
         
-        logger.info(f"🚀 Started HIGH-PERFORMANCE Event Hub producer for {self.event_hub_name}")
-        logger.info(f"   Namespace: {self.event_hub_namespace}")
-        logger.info(f"   Optimized for extreme throughput")
-        
     async def stop(self) -> None:
-        """Stop the Event Hub producer client."""
-        if self.producer_client:
+        """Stop all Event Hub producer clients."""
+        if self._producer_pool:
+            await asyncio.gather(*[client.close() for client in self._producer_pool])
+        elif self.producer_client:
             await self.producer_client.close()
-            self.producer_client = None
+        self._producer_pool = []
+        self._rr = None
+        self.producer_client = None
         logger.info("Stopped Event Hub producer")
         
+    @property
+    def vehicles(self) -> List[Vehicle]:
+        """Simulated vehicles, brought up to date with the fleet arrays on each access.
+        
+        The fleet arrays hold the live state, so changes made to these objects are not
+        picked up by the simulation.
+        """
+        self.fleet.sync_vehicles()
+        return self._vehicles
+        
     def create_demo_routes(self) -> List[Route]:
         """Create demo routes for vehicle simulation."""
         # Demo route 1: Manhattan loop
@@ -134,74 +200,72 @@ class VehicleEventGenerator:
             logger.warning(f"No routes found for route_tag: {route_tag}")
             routes = self.create_demo_routes()[:1]  # Use first route as fallback
             
-        self.vehicles = []
+        self._vehicles = []
+        self._body_prefixes = []
+        self._vehicle_partitions = []
+        self._props_templates = []
+        
+        # Add some randomness to starting positions and speeds, drawn for the whole fleet at once
+        rng = np.random.default_rng()
+        last_start_waypoint = np.array([max(0, len(route.waypoints) - 2) for route in routes])
+        route_ids = np.arange(num_vehicles) % len(routes)
+        starting_waypoints = rng.integers(0, last_start_waypoint[route_ids] + 1).tolist()
+        starting_progress = rng.uniform(0.0, 1.0, num_vehicles).tolist()
+        speeds = rng.uniform(20.0, 40.0, num_vehicles).tolist()  # 20-40 km/h
         
         # Distribute vehicles across available routes
+        vehicle_ids = itertools.count(1)
         for i in range(num_vehicles):
             route = routes[i % len(routes)]
             
-            # Add some randomness to starting positions and speeds
-            import random
-            starting_waypoint = random.randint(0, max(0, len(route.waypoints) - 2))
-            starting_progress = random.uniform(0.0, 1.0)
-            speed = random.uniform(20.0, 40.0)  # 20-40 km/h
-            
             vehicle = Vehicle(
-                id=f"vehicle-{i+1:03d}",
+                id=next(vehicle_ids),
                 route=route,
-                current_waypoint_index=starting_waypoint,
-                progress_to_next_waypoint=starting_progress,
-                speed_km_hr=speed
+                current_waypoint_index=starting_waypoints[i],
+                progress_to_next_waypoint=starting_progress[i],
+                speed_km_hr=speeds[i]
             )
             vehicle.update_heading()
-            self.vehicles.append(vehicle)
             
-        logger.info(f"Set up {len(self.vehicles)} vehicles across {len(routes)} routes")
-        
-    def create_vehicle_position_event(self, vehicle: Vehicle, agency: str, current_time: datetime) -> CloudEvent:
-        """Create a CloudEvent for a vehicle position.
-        
-        Args:
-            vehicle: Vehicle object with current position
-            agency: Transit agency identifier
-            current_time: Pre-calculated current time for consistency
+            # Pre-encode the per-vehicle constant payload fields once as the opening of the
+            # JSON object, so the hot path only has to encode the values that change every tick.
+            # Consumers read vehicleId as a string, so the integer id is only stringified here.
+            vehicle_name = vehicle.name
+            self._body_prefixes.append(orjson.dumps({
+                "agency": agency,
+                "routeTag": route.tag,
+                "vehicleId": vehicle_name,
+                "predictable": True
+            })[:-1] + b",")
+            self._vehicle_partitions.append(self._get_partition_for_vehicle(vehicle.id))
+            self._props_templates.append({
+                "ce-specversion": "1.0",
+                "ce-type": "vehicle.position",
+                "ce-source": "vehicle-generator",
+                "ce-subject": f"{agency}/{vehicle_name}",
+                "ce-datacontenttype": "application/json"
+            })
+            self._vehicles.append(vehicle)
             
-        Returns:
-            CloudEvent object ready for sending
-        """
-        lat, lon = vehicle.get_current_position()
-        
-        position = VehiclePosition(
-            agency=agency,
-            route_tag=vehicle.route.tag,
-            vehicle_id=vehicle.id,
-            lat=lat,
-            lon=lon,
-            heading=vehicle.heading,
-            speed_km_hr=vehicle.speed_km_hr,
-            timestamp=current_time
-        )
-        
-        # Create CloudEvent
-        event = CloudEvent(
-            {
-                "type": "vehicle.position",
-                "source": "vehicle-generator",
-                "subject": f"{agency}/{vehicle.id}",
-                "id": str(uuid.uuid4()),
-                "time": position.timestamp.isoformat(),
-                "datacontenttype": "application/json"
-            },
-            position.to_dict()
-        )
+        self._partition_groups = list(dict.fromkeys(self._vehicle_partitions))
+        self.fleet = Fleet(routes, self._vehicles)
+            
+        logger.info(f"Set up {len(self._vehicles)} vehicles across {len(routes)} routes")
         
-        return event
+    def _get_partition_for_vehicle(self, vehicle_id: int) -> Optional[str]:
+        """Pick a stable partition for a vehicle, or None if partitions are unknown."""
+        if not self._partition_ids:
+            return None
+        return self._partition_ids[vehicle_id % len(self._partition_ids)]
         
-    async def send_vehicle_events(self, agency: str) -> None:
+    async def send_vehicle_events(self, agency: str) -> int:
         """Send events for all vehicles with high-performance optimizations.
         
         Args:
             agency: Transit agency identifier
+            
+        Returns:
+            Number of events sent successfully
         """
         if not self.producer_client:
             raise RuntimeError("Producer client not started")
@@ -209,143 +273,260 @@ class VehicleEventGenerator:
         start_time = asyncio.get_event_loop().time()
         
         # Use a single timestamp for all events in this batch for consistency
-        current_time = datetime.now(timezone.utc)
-        time_iso = current_time.isoformat()
-        
-        # Pre-compute common data to avoid repeated work
-        agency_vehicles = [(agency, vehicle) for vehicle in self.vehicles]
-        
-        # Create all events with maximum concurrency
-        events_to_send = await self._create_all_events_optimized(agency_vehicles, current_time, time_iso)
+        time_iso = self._format_timestamp(time.time())
+        
+        # Events are built and sent as a pipeline: a queue per target partition feeds sender
+        # tasks that batch and send. Event creation itself is pure CPU work and stays
+        # synchronous, so the builder yields every batch's worth of events to let senders
+        # pick them up and start sending any partition batch that has filled.
+        queues: Dict[Optional[str], asyncio.Queue] = {}
+        live_senders: Dict[Optional[str], int] = {}
+        senders = []
+        for partition_id in self._partition_groups:
+            queue: asyncio.Queue = asyncio.Queue(maxsize=1000)
+            queues[partition_id] = queue
+            # Each partition gets one sender; unpartitioned events are shared by several
+            num_senders = 1 if partition_id is not None else self.sender_concurrency
+            live_senders[partition_id] = num_senders
+            senders.extend(
+                asyncio.create_task(self._send_from_queue(queue, partition_id, live_senders))
+                for _ in range(num_senders)
+            )
         
-        # Send events in parallel batches for maximum throughput
-        total_events_sent = await self._send_events_parallel_batches(events_to_send)
+        try:
+            # Positions come straight from the fleet arrays as plain floats, converted once per tick
+            yield_every = self._current_batch_size
+            for i, (partition_id, lat, lon, heading, speed) in enumerate(zip(
+                    self._vehicle_partitions, self.fleet.lat.tolist(), self.fleet.lon.tolist(),
+                    self.fleet.heading.tolist(), self.fleet.speed.tolist())):
+                event_data = self._build_event_sync(i, lat, lon, heading, speed, time_iso)
+                await queues[partition_id].put(event_data)
+                # Queue.put only suspends on a full queue, so yield explicitly
+                if (i + 1) % yield_every == 0:
+                    await asyncio.sleep(0)
+            
+            # Signal the end of this tick's events to the senders
+            for queue in queues.values():
+                await queue.put(None)
+            
+            total_events_sent = sum(await asyncio.gather(*senders))
+        except BaseException:
+            for sender in senders:
+                sender.cancel()
+            raise
         
-        end_time = asyncio.get_event_loop().time()
-        elapsed_ms = (end_time - start_time) * 1000
-        events_per_second = total_events_sent / (elapsed_ms / 1000) if elapsed_ms > 0 else 0
+        # Performance metrics every 10 ticks, formatted lazily and only if INFO is enabled
+        self._tick_count += 1
+        if self._tick_count % 10 == 0 and logger.isEnabledFor(logging.INFO):
+            end_time = asyncio.get_event_loop().time()
+            elapsed_ms = (end_time - start_time) * 1000
+            events_per_second = total_events_sent / (elapsed_ms / 1000) if elapsed_ms > 0 else 0
+            logger.info("🚀 HIGH-PERF: %d events | %d vehicles | %.1fms | %.0f events/sec",
+                        total_events_sent, len(self.fleet), elapsed_ms, events_per_second)
         
-        # Enhanced logging with performance metrics
-        logger.info(f"🚀 HIGH-PERF: {total_events_sent} events | {len(self.vehicles)} vehicles | "
-                   f"{elapsed_ms:.1f}ms | {events_per_second:.0f} events/sec")
-
-    async def _create_all_events_optimized(self, agency_vehicles: list, current_time: datetime, time_iso: str) -> list:
-        """Create all events with maximum optimization."""
-        # Use semaphore to control concurrency and avoid overwhelming the system
-        semaphore = asyncio.Semaphore(100)  # Limit concurrent event creation
-        
-        async def create_event_with_semaphore(agency, vehicle):
-            async with semaphore:
-                return await self._create_event_data_optimized(vehicle, agency, current_time, time_iso)
-        
-        # Create all events concurrently with controlled concurrency
-        tasks = [create_event_with_semaphore(agency, vehicle) for agency, vehicle in agency_vehicles]
-        return await asyncio.gather(*tasks)
+        return total_events_sent
 
-    async def _send_events_parallel_batches(self, events_to_send: list) -> int:
-        """Send events using parallel batches for maximum throughput."""
-        if not events_to_send:
-            return 0
-            
-        # Split events into multiple batches for parallel sending
-        batch_size = 100  # Optimal batch size for Event Hubs
-        event_batches = [events_to_send[i:i + batch_size] for i in range(0, len(events_to_send), batch_size)]
-        
-        # Send batches in parallel with limited concurrency
-        semaphore = asyncio.Semaphore(10)  # Limit concurrent batch sends
+    async def _send_from_queue(self, queue: asyncio.Queue, partition_id: Optional[str],
+                               live_senders: Dict[Optional[str], int]) -> int:
+        """Drain events from a queue into as few EventDataBatch objects as possible.
         
-        async def send_batch_with_semaphore(events_batch):
-            async with semaphore:
-                return await self._send_single_batch(events_batch)
+        Runs until a None sentinel is received; the sentinel is put back so other senders
+        sharing the queue stop as well. If sending fails, this sender stops and leaves the
+        rest of the queue to the other senders sharing it. Only the last sender of a queue
+        keeps draining it, dropping the events, so the event builder never blocks.
         
-        # Send all batches concurrently
-        batch_results = await asyncio.gather(*[send_batch_with_semaphore(batch) for batch in event_batches])
+        Args:
+            queue: Queue of EventData objects, terminated by None
+            partition_id: Partition to send to, or None to let Event Hubs choose
+            live_senders: Number of running senders per queue, shared by this tick's senders
+            
+        Returns:
+            Number of events sent successfully
+        """
+        # Each sender sticks to one pooled client for the whole tick
+        producer = next(self._rr) if self._rr else self.producer_client
+        
+        # Sends are pipelined: while one batch is in flight the next one is created and
+        # filled. At most one send per sender is outstanding so partition order is kept.
+        pending_send: Optional[asyncio.Task] = None
+        pending_events = 0
+        finished = False
+        events_received = 0
+        events_sent = 0
+        
+        async def start_send(event_data_batch, events_in_batch: int, filled: bool,
+                             size_limited: bool) -> None:
+            nonlocal pending_send, pending_events, events_sent
+            if pending_send is not None:
+                await pending_send
+                events_sent += pending_events
+            pending_send = asyncio.create_task(
+                self._send_and_tune(producer, event_data_batch, filled=filled, size_limited=size_limited)
+            )
+            pending_events = events_in_batch
         
-        return sum(batch_results)
-
-    async def _send_single_batch(self, events_batch: list) -> int:
-        """Send a single batch of events."""
         try:
-            event_data_batch = await self.producer_client.create_batch()
+            event_data_batch = await producer.create_batch(partition_id=partition_id)
             events_in_batch = 0
             
-            for event_data in events_batch:
+            while True:
+                event_data = await queue.get()
+                if event_data is None:
+                    finished = True
+                    queue.put_nowait(None)
+                    break
+                events_received += 1
+                
+                # Flush pre-emptively once the tuned batch size is reached
+                if events_in_batch >= self._current_batch_size:
+                    await start_send(event_data_batch, events_in_batch, filled=True, size_limited=False)
+                    event_data_batch = await producer.create_batch(partition_id=partition_id)
+                    events_in_batch = 0
+                
                 try:
                     event_data_batch.add(event_data)
                     events_in_batch += 1
                 except ValueError:
-                    # Current batch is full, send it and start a new one
+                    # Current batch hit the Event Hubs size limit, send it and start a new one
                     if events_in_batch > 0:
-                        await self.producer_client.send_batch(event_data_batch)
+                        await start_send(event_data_batch, events_in_batch, filled=True, size_limited=True)
                     
                     # Create new batch and add the current event
-                    event_data_batch = await self.producer_client.create_batch()
+                    event_data_batch = await producer.create_batch(partition_id=partition_id)
                     event_data_batch.add(event_data)
                     events_in_batch = 1
             
             # Send the final batch if it has events
             if events_in_batch > 0:
-                await self.producer_client.send_batch(event_data_batch)
+                await start_send(event_data_batch, events_in_batch, filled=False, size_limited=False)
+            if pending_send is not None:
+                await pending_send
+                events_sent += pending_events
                 
-            return len(events_batch)
+            live_senders[partition_id] -= 1
+            return events_sent
             
         except Exception as e:
-            logger.error(f"Error sending batch: {e}")
-            return 0
+            # Let a send still in flight finish so its events are counted and its error,
+            # if it is the one that failed, is retrieved
+            if pending_send is not None:
+                try:
+                    await pending_send
+                    events_sent += pending_events
+                except Exception:
+                    pass
+            
+            live_senders[partition_id] -= 1
+            if live_senders[partition_id] > 0:
+                logger.error(f"Error sending batch to partition {partition_id}: {e} "
+                             f"({events_received - events_sent} events lost, "
+                             f"remaining events left to the other senders)")
+                return events_sent
+            
+            # Last sender of this queue: keep draining so the event builder never blocks
+            dropped = events_received - events_sent
+            while not finished:
+                if await queue.get() is None:
+                    finished = True
+                    queue.put_nowait(None)
+                else:
+                    dropped += 1
+            logger.error(f"Error sending batch to partition {partition_id}: {e} "
+                         f"({dropped} events dropped this tick)")
+            return events_sent
         
-    async def _create_event_data_optimized(self, vehicle: Vehicle, agency: str, current_time: datetime, time_iso: str) -> EventData:
+        finally:
+            if pending_send is not None and not pending_send.done():
+                pending_send.cancel()
+    
+    async def _send_and_tune(self, producer: EventHubProducerClient, event_data_batch,
+                             filled: bool, size_limited: bool) -> None:
+        """Send a batch and adjust the target batch size from the observed send latency.
+        
+        Args:
+            producer: Producer client the batch was created on
+            event_data_batch: Batch to send
+            filled: Whether the batch was flushed because it was full
+            size_limited: Whether the batch was flushed because it hit the size limit
+        """
+        loop = asyncio.get_event_loop()
+        send_start = loop.time()
+        await producer.send_batch(event_data_batch)
+        elapsed_ms = (loop.time() - send_start) * 1000
+        
+        # Only grow on full batches; a short tail batch says nothing about capacity
+        if filled and not size_limited and elapsed_ms < 0.5 * self._target_send_ms:
+            self._current_batch_size = min(5000, int(self._current_batch_size * 1.25))
+        elif elapsed_ms > 1.5 * self._target_send_ms:
+            self._current_batch_size = max(50, int(self._current_batch_size * 0.8))
+        
+    def _format_timestamp(self, timestamp: float) -> str:
+        """Format a Unix timestamp as an ISO 8601 UTC string.
+        
+        The date/time prefix is only re-formatted when the second changes; each call
+        just appends the microseconds.
+        
+        Args:
+            timestamp: Seconds since the epoch, as returned by time.time()
+            
+        Returns:
+            Timestamp string such as '2024-01-15T10:30:00.123456+00:00'
+        """
+        seconds, microseconds = divmod(round(timestamp * 1_000_000), 1_000_000)
+        if seconds != self._timestamp_second:
+            self._timestamp_second = seconds
+            self._timestamp_prefix = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(seconds))
+        return f"{self._timestamp_prefix}.{microseconds:06d}+00:00"
+        
+    def _build_event_sync(self, vehicle_index: int, lat: float, lon: float, heading: float,
+                          speed: float, time_iso: str) -> EventData:
         """Create EventData for a single vehicle with maximum optimization.
         
         Args:
-            vehicle: Vehicle object with current position
-            agency: Transit agency identifier
-            current_time: Pre-calculated current time for consistency
+            vehicle_index: Index of the vehicle in self.vehicles, used to look up its
+                pre-built static event parts
+            lat: Current latitude
+            lon: Current longitude
+            heading: Current heading in degrees
+            speed: Current speed in km/h
             time_iso: Pre-calculated ISO timestamp string
             
         Returns:
             EventData object ready for sending
         """
-        # Get position (this is already optimized in the Vehicle class)
-        lat, lon = vehicle.get_current_position()
-        
-        # Create the data payload directly as dict to avoid object overhead
-        event_data_dict = {
-            "agency": agency,
-            "routeTag": vehicle.route.tag,
-            "vehicleId": vehicle.id,
+        # Encode only the mutable values and splice them onto the pre-encoded constant fields
+        body = self._body_prefixes[vehicle_index] + orjson.dumps({
             "lat": lat,
             "lon": lon,
-            "heading": vehicle.heading,
-            "speedKmHr": vehicle.speed_km_hr,
-            "timestamp": time_iso,
-            "predictable": True
-        }
-        
-        # Create EventData directly with JSON string (avoid CloudEvent overhead for high throughput)
-        event_data = EventData(json.dumps(event_data_dict))
-        
-        # Add minimal CloudEvent headers for compatibility
-        event_id = str(uuid.uuid4())
-        event_data.properties = {
-            "ce-specversion": "1.0",
-            "ce-type": "vehicle.position",
-            "ce-source": "vehicle-generator",
-            "ce-subject": f"{agency}/{vehicle.id}",
-            "ce-id": event_id,
-            "ce-time": time_iso,
-            "ce-datacontenttype": "application/json"
-        }
+            "heading": heading,
+            "speedKmHr": speed,
+            "timestamp": time_iso
+        })[1:]
+        
+        # Create EventData directly from JSON bytes (avoid CloudEvent overhead for high throughput)
+        event_data = EventData(body)
+        
+        # Add minimal CloudEvent headers for compatibility, unless consumers only read the body
+        if self._emit_ce_props:
+            event_id = f"{self._id_prefix}-{self._id_counter}"
+            self._id_counter += 1
+            properties = self._props_templates[vehicle_index].copy()
+            properties["ce-id"] = event_id
+            properties["ce-time"] = time_iso
+            event_data.properties = properties
         
         return event_data
                 
     def advance_vehicles(self, time_step_seconds: float) -> None:
         """Advance all vehicles along their routes.
         
+        The whole fleet is updated at once on its NumPy arrays; self.vehicles catches up
+        with them when it is next read.
+        
         Args:
             time_step_seconds: Time step for vehicle advancement
         """
-        for vehicle in self.vehicles:
-            vehicle.advance(time_step_seconds)
+        self.fleet.advance_all(time_step_seconds)
             
     async def run_feed(self, agency: str, route_tag: Optional[str] = None, 
                       num_vehicles: int = 1000, poll_interval: float = 0.5) -> None:
@@ -358,8 +539,12 @@ class VehicleEventGenerator:
             poll_interval: Interval between event batches in seconds
         """
         self.setup_vehicles(agency, route_tag, num_vehicles)
+        self.fleet.warm_up()
         self.running = True
         
+        # Aim for each send to take about a quarter of the poll interval
+        self._target_send_ms = max(50.0, poll_interval * 250)
+        
         # Calculate expected performance metrics
         expected_events_per_sec = num_vehicles / poll_interval if poll_interval > 0 else 0
         
@@ -379,14 +564,14 @@ class VehicleEventGenerator:
                 batch_start = asyncio.get_event_loop().time()
                 
                 # Send current vehicle positions
-                await self.send_vehicle_events(agency)
+                events_sent = await self.send_vehicle_events(agency)
                 
                 # Update performance tracking
-                total_events_sent += num_vehicles
+                total_events_sent += events_sent
                 batch_count += 1
                 
                 # Log performance metrics every 10 batches to reduce logging overhead
-                if batch_count % 10 == 0:
+                if batch_count % 10 == 0 and logger.isEnabledFor(logging.INFO):
                     elapsed_time = asyncio.get_event_loop().time() - start_time
                     if elapsed_time > 0:
                         actual_events_per_sec = total_events_sent / elapsed_time
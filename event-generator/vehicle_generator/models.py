@@ -1,12 +1,32 @@
 """Data models for vehicle event generation."""
 
-from dataclasses import dataclass
+from __future__ import annotations
+
+from bisect import bisect_right
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import List, Optional, Tuple
-import uuid
+from math import cos, hypot, pi, sqrt
+from typing import List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import orjson
+
+try:
+    from numba import njit, prange
+    _HAVE_NUMBA = True
+except ImportError:  # numba is optional; fall back to the NumPy implementation
+    _HAVE_NUMBA = False
+
 
+# WGS84 ellipsoid constants for the cheap-ruler distance approximation
+_EARTH_EQUATORIAL_RADIUS_KM = 6378.137
+_EARTH_FLATTENING = 1 / 298.257223563
+_EARTH_E2 = _EARTH_FLATTENING * (2 - _EARTH_FLATTENING)
+_DEG2RAD = pi / 180
+_KM_PER_DEGREE = _EARTH_EQUATORIAL_RADIUS_KM * _DEG2RAD
 
-@dataclass
+
+@dataclass(slots=True)
 class VehiclePosition:
     """Represents a vehicle's current position and status."""
     
@@ -20,8 +40,13 @@ class VehiclePosition:
     timestamp: datetime
     predictable: bool = True
     
-    def to_dict(self) -> dict:
-        """Convert to dictionary for JSON serialization."""
+    def to_dict(self, timestamp_iso: Optional[str] = None) -> dict:
+        """Convert to dictionary for JSON serialization.
+        
+        Args:
+            timestamp_iso: Pre-formatted ISO timestamp to use instead of formatting
+                `timestamp`; pass it when many positions share the same tick time
+        """
         return {
             "agency": self.agency,
             "routeTag": self.route_tag,
@@ -30,137 +55,386 @@ class VehiclePosition:
             "lon": self.lon,
             "heading": self.heading,
             "speedKmHr": self.speed_km_hr,
-            "timestamp": self.timestamp.isoformat(),
+            "timestamp": timestamp_iso if timestamp_iso is not None else self.timestamp.isoformat(),
             "predictable": self.predictable
         }
+    
+    def to_json(self, timestamp_iso: Optional[str] = None) -> bytes:
+        """Serialize to_dict() to JSON bytes with orjson.
+        
+        Args:
+            timestamp_iso: Pre-formatted ISO timestamp to use instead of formatting
+                `timestamp`
+        """
+        return orjson.dumps(self.to_dict(timestamp_iso))
 
 
-@dataclass
+@dataclass(slots=True)
 class Route:
     """Represents a transit route with waypoints."""
     
     tag: str
     title: str
-    waypoints: List[Tuple[float, float]]  # List of (lat, lon) coordinates
+    # (lat, lon) coordinates; stored as a (W, 2) float64 array. Routes are identified by
+    # tag, and an array field cannot take part in the generated __eq__.
+    waypoints: Union[np.ndarray, Sequence[Tuple[float, float]]] = field(compare=False)
     
-    def get_distance_between_points(self, point1: Tuple[float, float], 
-                                  point2: Tuple[float, float]) -> float:
-        """Calculate approximate distance between two GPS coordinates in km."""
-        import math
-        
-        lat1, lon1 = point1
-        lat2, lon2 = point2
+    # Precomputed segment tables, filled in by __post_init__
+    _ruler_factors: Tuple[float, float] = field(init=False, repr=False, compare=False)
+    _seg_km: np.ndarray = field(init=False, repr=False, compare=False)
+    _cum_km: np.ndarray = field(init=False, repr=False, compare=False)
+    _total_km: float = field(init=False, repr=False, compare=False)
+    _bearings: np.ndarray = field(init=False, repr=False, compare=False)
+    
+    def __post_init__(self) -> None:
+        """Precompute per-segment distances, cumulative distances and headings.
         
-        # Convert to radians
-        lat1_rad = math.radians(lat1)
-        lon1_rad = math.radians(lon1)
-        lat2_rad = math.radians(lat2)
-        lon2_rad = math.radians(lon2)
+        Waypoints never change, so these are computed once here instead of on every
+        vehicle update. Segment i runs from waypoint i to waypoint i+1.
+        """
+        # Accept a list of (lat, lon) tuples or an array; always store one contiguous array
+        self.waypoints = np.ascontiguousarray(self.waypoints, dtype=np.float64).reshape(-1, 2)
+        points = self.waypoints
         
-        # Haversine formula
-        dlat = lat2_rad - lat1_rad
-        dlon = lon2_rad - lon1_rad
+        # Cheap-ruler flat-earth approximation: km per degree of longitude/latitude,
+        # evaluated once at the route's mean latitude. For city-scale routes this is as
+        # accurate as haversine without any per-distance trigonometry.
+        mean_lat = float(points[:, 0].mean()) if len(points) else 0.0
+        cos_lat = cos(mean_lat * _DEG2RAD)
+        w2 = 1 / (1 - _EARTH_E2 * (1 - cos_lat * cos_lat))
+        w = sqrt(w2)
+        self._ruler_factors = (_KM_PER_DEGREE * w * cos_lat, _KM_PER_DEGREE * w * w2 * (1 - _EARTH_E2))
         
-        a = (math.sin(dlat / 2) ** 2 + 
-             math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon / 2) ** 2)
-        c = 2 * math.asin(math.sqrt(a))
+        start, end = points[:-1], points[1:]
+        kx, ky = self._ruler_factors
+        self._seg_km = np.hypot((end[:, 1] - start[:, 1]) * kx, (end[:, 0] - start[:, 0]) * ky)
+        self._cum_km = np.concatenate(([0.0], np.cumsum(self._seg_km)))
+        self._total_km = float(self._cum_km[-1])
         
-        # Earth's radius in km
-        r = 6371
+        # Initial bearing of each segment. sin/cos of each waypoint latitude are computed
+        # once and shared by the segments on either side of it.
+        lat_rad = np.radians(points[:, 0])
+        sin_lats = np.sin(lat_rad)
+        cos_lats = np.cos(lat_rad)
+        dlon_rad = np.radians(np.diff(points[:, 1]))
+        y = np.sin(dlon_rad) * cos_lats[1:]
+        x = (cos_lats[:-1] * sin_lats[1:] -
+             sin_lats[:-1] * cos_lats[1:] * np.cos(dlon_rad))
+        # atan2 yields (-180, 180]; shift negatives up instead of a floating-point modulo
+        self._bearings = np.degrees(np.arctan2(y, x))
+        self._bearings += (self._bearings < 0.0) * 360.0
+    
+    def _distance_and_bearing(self, index: int) -> Tuple[float, float]:
+        """Get the length in km and the heading in degrees of segment `index`."""
+        return float(self._seg_km[index]), float(self._bearings[index])
+    
+    def get_distance_between_points(self, point1: Tuple[float, float], 
+                                  point2: Tuple[float, float]) -> float:
+        """Calculate approximate distance between two GPS coordinates in km.
         
-        return c * r
+        Uses the route's cheap-ruler factors, so it is intended for points on or near
+        this route.
+        """
+        lat1, lon1 = point1
+        lat2, lon2 = point2
+        kx, ky = self._ruler_factors
+        return hypot((lon2 - lon1) * kx, (lat2 - lat1) * ky)
 
 
-@dataclass
+@dataclass(slots=True)
 class Vehicle:
     """Represents a vehicle with its current state."""
     
-    id: str
+    id: int
     route: Route
     current_waypoint_index: int = 0
     progress_to_next_waypoint: float = 0.0  # 0.0 to 1.0
     speed_km_hr: float = 25.0  # Default speed
     heading: float = 0.0
+    distance_km: float = field(init=False, default=0.0)  # Distance travelled along the route
+    
+    def __post_init__(self) -> None:
+        """Derive the distance along the route from the starting waypoint and progress."""
+        seg_km = self.route._seg_km
+        if self.current_waypoint_index >= len(seg_km):
+            self.distance_km = self.route._total_km
+        else:
+            self.distance_km = float(self.route._cum_km[self.current_waypoint_index] +
+                                     seg_km[self.current_waypoint_index] * self.progress_to_next_waypoint)
+    
+    @property
+    def name(self) -> str:
+        """Vehicle identifier as published in events, e.g. "vehicle-007"."""
+        return f"vehicle-{self.id:03d}"
     
     def get_current_position(self) -> Tuple[float, float]:
         """Get current interpolated position between waypoints."""
-        if not self.route.waypoints:
+        waypoints = np.asarray(self.route.waypoints)
+        if not len(waypoints):
             return (0.0, 0.0)
             
-        if self.current_waypoint_index >= len(self.route.waypoints) - 1:
+        if self.current_waypoint_index >= len(waypoints) - 1:
             # At the end of route, return last waypoint
-            return self.route.waypoints[-1]
+            return tuple(waypoints[-1].tolist())
             
-        current_waypoint = self.route.waypoints[self.current_waypoint_index]
-        next_waypoint = self.route.waypoints[self.current_waypoint_index + 1]
-        
         # Interpolate between current and next waypoint
-        lat = (current_waypoint[0] + 
-               (next_waypoint[0] - current_waypoint[0]) * self.progress_to_next_waypoint)
-        lon = (current_waypoint[1] + 
-               (next_waypoint[1] - current_waypoint[1]) * self.progress_to_next_waypoint)
-        
-        return (lat, lon)
+        current_waypoint, next_waypoint = waypoints[self.current_waypoint_index:self.current_waypoint_index + 2]
+        return tuple((current_waypoint + (next_waypoint - current_waypoint) * self.progress_to_next_waypoint).tolist())
     
     def update_heading(self) -> None:
         """Update heading based on direction to next waypoint."""
-        import math
-        
         if self.current_waypoint_index >= len(self.route.waypoints) - 1:
             return
             
-        current_waypoint = self.route.waypoints[self.current_waypoint_index]
-        next_waypoint = self.route.waypoints[self.current_waypoint_index + 1]
+        _, self.heading = self.route._distance_and_bearing(self.current_waypoint_index)
+    
+    def advance(self, time_step_seconds: float) -> None:
+        """Advance vehicle along route based on time step.
         
-        # Calculate bearing
-        lat1, lon1 = current_waypoint
-        lat2, lon2 = next_waypoint
+        The vehicle's distance along the route wraps around at the end of the route;
+        the current segment is then found by binary search over the cumulative segment
+        distances, so no per-waypoint loop is needed however far the vehicle moved.
+        """
+        total_km = self.route._total_km
+        if total_km <= 0:
+            return
+            
+        self.distance_km = (self.distance_km + (self.speed_km_hr / 3600) * time_step_seconds) % total_km
         
-        lat1_rad = math.radians(lat1)
-        lat2_rad = math.radians(lat2)
-        dlon_rad = math.radians(lon2 - lon1)
+        index = bisect_right(self.route._cum_km, self.distance_km) - 1
+        segment_distance, self.heading = self.route._distance_and_bearing(index)
+        self.current_waypoint_index = index
+        self.progress_to_next_waypoint = (self.distance_km - float(self.route._cum_km[index])) / segment_distance
+
+
+if _HAVE_NUMBA:
+    @njit(cache=True, parallel=True, fastmath=True, boundscheck=False)
+    def advance_fleet(distance_km: np.ndarray, wp_idx: np.ndarray, progress: np.ndarray,
+                      speed: np.ndarray, route_id: np.ndarray,
+                      lat_out: np.ndarray, lon_out: np.ndarray, heading_out: np.ndarray,
+                      route_waypoints_flat: np.ndarray, route_starts: np.ndarray, route_lens: np.ndarray,
+                      route_total_km: np.ndarray, cum_km: np.ndarray, segment_km: np.ndarray,
+                      segment_heading: np.ndarray, dt: float) -> None:
+        """Advance every vehicle and write its new position and heading, in one fused loop.
+        
+        Vehicles are independent, so when numba is installed the loop is compiled and
+        spread across cores with prange. See Fleet.advance_all for the equivalent NumPy
+        implementation used without numba.
+        """
+        for i in prange(distance_km.shape[0]):
+            route = route_id[i]
+            total = route_total_km[route]
+            if total <= 0.0:
+                continue
+            start = route_starts[route]
         
-        y = math.sin(dlon_rad) * math.cos(lat2_rad)
-        x = (math.cos(lat1_rad) * math.sin(lat2_rad) - 
-             math.sin(lat1_rad) * math.cos(lat2_rad) * math.cos(dlon_rad))
+            # Distance along the route wraps at the end; the segment is found by binary search
+            d = (distance_km[i] + (speed[i] / 3600.0) * dt) % total
+            index = np.searchsorted(cum_km[start:start + route_lens[route] - 1], d, side='right') - 1
+            current = start + index
+            p = (d - cum_km[current]) / segment_km[current]
         
-        bearing = math.atan2(y, x)
-        bearing_degrees = (math.degrees(bearing) + 360) % 360
+            distance_km[i] = d
+            wp_idx[i] = index
+            progress[i] = p
         
-        self.heading = bearing_degrees
+            lat = route_waypoints_flat[current, 0]
+            lon = route_waypoints_flat[current, 1]
+            lat_out[i] = lat + (route_waypoints_flat[current + 1, 0] - lat) * p
+            lon_out[i] = lon + (route_waypoints_flat[current + 1, 1] - lon) * p
+            heading_out[i] = segment_heading[current]
+
+
+def _segment_waypoints(waypoints: np.ndarray) -> np.ndarray:
+    """Get a route's waypoints padded to at least one (possibly zero-length) segment."""
+    if len(waypoints) >= 2:
+        return waypoints
+    return np.repeat(waypoints[-1:] if len(waypoints) else np.zeros((1, 2)), 2, axis=0)
+
+
+class Fleet:
+    """Vehicle state for a whole fleet, stored as NumPy arrays (structure of arrays).
     
-    def advance(self, time_step_seconds: float) -> None:
-        """Advance vehicle along route based on time step."""
-        if not self.route.waypoints or self.current_waypoint_index >= len(self.route.waypoints) - 1:
+    Each array has one entry per vehicle, in the order of the vehicles the fleet was
+    built from. Waypoints of all routes are stored back to back so a vehicle's current
+    segment can be gathered with a single index.
+    
+    Movement is implemented three times, on purpose: Vehicle.advance for a single vehicle
+    used on its own, the numba kernel advance_fleet for the feed, and a NumPy version in
+    advance_all for installs without numba (numba is optional). All three wrap distance
+    around the route and pick the segment by binary search over the route's cumulative
+    distances; tests/test_models.py checks that they agree step for step.
+    """
+    
+    def __init__(self, routes: List[Route], vehicles: List[Vehicle]):
+        """Build the fleet arrays from the vehicles' starting state.
+        
+        Args:
+            routes: Routes the vehicles are distributed across
+            vehicles: Vehicles to simulate; each must use one of the given routes
+        """
+        # A route's segment i runs from its waypoint i to i+1, so the slot for each
+        # route's last waypoint is never used as a segment. Routes with fewer than two
+        # waypoints get one zero-length segment (at their only waypoint, or at (0, 0) when
+        # empty) so every vehicle always has a valid segment to sit on.
+        route_waypoints = [_segment_waypoints(np.asarray(route.waypoints)) for route in routes]
+        self._route_lens = np.array([len(waypoints) for waypoints in route_waypoints], dtype=np.int64)
+        self._route_starts = np.concatenate(([0], np.cumsum(self._route_lens)[:-1])).astype(np.int64)
+        self._waypoints = np.concatenate(route_waypoints or [np.empty((0, 2))])
+        
+        # Segment tables come from the routes' precomputed values, laid out like the
+        # waypoints (padded with unused zero slots)
+        self._segment_km = np.concatenate(
+            [np.pad(route._seg_km, (0, n - len(route._seg_km))) for route, n in zip(routes, self._route_lens)]
+            or [np.empty(0)]
+        )
+        self._segment_heading = np.concatenate(
+            [np.pad(route._bearings, (0, n - len(route._bearings))) for route, n in zip(routes, self._route_lens)]
+            or [np.empty(0)]
+        )
+        # Each route's own cumulative distances, laid out like the waypoints. Segments are
+        # searched per route with the vehicle's distance along it, exactly as Vehicle.advance
+        # does, so rounding can never land a vehicle on a zero-length segment.
+        self._cum_km = np.concatenate(
+            [np.pad(route._cum_km, (0, n - len(route._cum_km))) for route, n in zip(routes, self._route_lens)]
+            or [np.empty(0)]
+        )
+        self._route_total_km = np.array([route._total_km for route in routes], dtype=np.float64)
+        
+        route_index = {route.tag: i for i, route in enumerate(routes)}
+        self._vehicles = vehicles
+        self.route_id = np.array([route_index[v.route.tag] for v in vehicles], dtype=np.int64)
+        self._labels = [(v.route.tag, v.name) for v in vehicles]
+        self.distance_km = np.array([v.distance_km for v in vehicles], dtype=np.float64)
+        self.wp_idx = np.array([v.current_waypoint_index for v in vehicles], dtype=np.int64)
+        self.progress = np.array([v.progress_to_next_waypoint for v in vehicles], dtype=np.float64)
+        self.speed = np.array([v.speed_km_hr for v in vehicles], dtype=np.float64)
+        
+        # Vehicles past their route's last segment sit at the end of it, as Vehicle does
+        last_segment = self._route_lens[self.route_id] - 2
+        at_end = self.wp_idx > last_segment
+        self.wp_idx[at_end] = last_segment[at_end]
+        self.progress[at_end] = 1.0
+        self.lat = np.empty(len(vehicles), dtype=np.float64)
+        self.lon = np.empty(len(vehicles), dtype=np.float64)
+        self.heading = np.empty(len(vehicles), dtype=np.float64)
+        
+        # For the NumPy path: the vehicles on each route that has a length to travel
+        self._route_groups = [
+            (int(start), int(num_waypoints), float(total_km), np.flatnonzero(self.route_id == r))
+            for r, (start, num_waypoints, total_km) in enumerate(
+                zip(self._route_starts, self._route_lens, self._route_total_km)
+            )
+            if total_km > 0 and (self.route_id == r).any()
+        ]
+        
+        self._update_positions()
+        
+    def __len__(self) -> int:
+        return len(self.route_id)
+        
+    def advance_all(self, time_step_seconds: float) -> None:
+        """Advance every vehicle along its route and update positions and headings.
+        
+        Uses one compiled kernel when numba is installed, or vectorized NumPy operations
+        otherwise.
+        
+        Args:
+            time_step_seconds: Time step for vehicle advancement
+        """
+        if len(self) == 0:
             return
             
-        # Calculate distance traveled in this time step
-        distance_km = (self.speed_km_hr / 3600) * time_step_seconds
-        
-        # Get distance to next waypoint
-        current_waypoint = self.route.waypoints[self.current_waypoint_index]
-        next_waypoint = self.route.waypoints[self.current_waypoint_index + 1]
-        segment_distance = self.route.get_distance_between_points(current_waypoint, next_waypoint)
-        
-        if segment_distance == 0:
-            # Move to next waypoint if current and next are the same
-            self.current_waypoint_index += 1
-            self.progress_to_next_waypoint = 0.0
+        if _HAVE_NUMBA:
+            self._advance_compiled(time_step_seconds, len(self))
             return
             
-        # Calculate how much progress we make on current segment
-        progress_increment = distance_km / segment_distance
-        self.progress_to_next_waypoint += progress_increment
-        
-        # If we've reached or passed the next waypoint
-        while self.progress_to_next_waypoint >= 1.0 and self.current_waypoint_index < len(self.route.waypoints) - 1:
-            self.progress_to_next_waypoint -= 1.0
-            self.current_waypoint_index += 1
+        for start, num_waypoints, total_km, vehicles in self._route_groups:
+            # Distance along the route wraps at the end of the route
+            distance_km = np.mod(
+                self.distance_km[vehicles] + (self.speed[vehicles] / 3600) * time_step_seconds, total_km
+            )
             
-            # If we're at the end of the route, loop back to start
-            if self.current_waypoint_index >= len(self.route.waypoints) - 1:
-                self.current_waypoint_index = 0
-                self.progress_to_next_waypoint = 0.0
-                break
+            # One binary search per route finds the segment of each of its vehicles
+            index = np.searchsorted(self._cum_km[start:start + num_waypoints - 1], distance_km, side='right') - 1
+            current = start + index
+            
+            self.distance_km[vehicles] = distance_km
+            self.wp_idx[vehicles] = index
+            self.progress[vehicles] = (distance_km - self._cum_km[current]) / self._segment_km[current]
+            
+        self._update_positions()
+        
+    def warm_up(self) -> None:
+        """Compile the numba kernel now rather than on the first tick.
+        
+        Compiling (or loading from numba's cache) can take a few seconds; call this before
+        a timed feed starts. Runs the kernel over no vehicles, so nothing is moved. Does
+        nothing without numba.
+        """
+        if _HAVE_NUMBA:
+            self._advance_compiled(0.0, 0)
+        
+    def sync_vehicles(self) -> None:
+        """Copy the current fleet state back onto the Vehicle objects it was built from."""
+        for vehicle, waypoint_index, progress, distance_km, heading in zip(
+            self._vehicles, self.wp_idx.tolist(), self.progress.tolist(),
+            self.distance_km.tolist(), self.heading.tolist()
+        ):
+            vehicle.current_waypoint_index = waypoint_index
+            vehicle.progress_to_next_waypoint = progress
+            vehicle.distance_km = distance_km
+            vehicle.heading = heading
+        
+    def snapshot_json(self, timestamp_iso: str, agency: str) -> bytes:
+        """Serialize the whole fleet's current positions as JSON Lines.
+        
+        Each line is one vehicle's position document, with the same fields in the same
+        order as the event bodies VehicleEventGenerator sends.
+        
+        Args:
+            timestamp_iso: Pre-formatted ISO timestamp shared by the whole snapshot, e.g.
+                from VehicleEventGenerator._format_timestamp so it matches the events
+            agency: Transit agency identifier
+            
+        Returns:
+            One JSON document per vehicle, separated by newlines
+        """
+        dumps = orjson.dumps
+        return b"\n".join([
+            dumps({
+                "agency": agency,
+                "routeTag": route_tag,
+                "vehicleId": vehicle_name,
+                "predictable": True,
+                "lat": lat,
+                "lon": lon,
+                "heading": heading,
+                "speedKmHr": speed,
+                "timestamp": timestamp_iso
+            })
+            for (route_tag, vehicle_name), lat, lon, heading, speed in zip(
+                self._labels, self.lat.tolist(), self.lon.tolist(), self.heading.tolist(), self.speed.tolist()
+            )
+        ])
+        
+    def _advance_compiled(self, time_step_seconds: float, num_vehicles: int) -> None:
+        """Run the compiled kernel over the first `num_vehicles` vehicles."""
+        advance_fleet(self.distance_km[:num_vehicles], self.wp_idx[:num_vehicles],
+                      self.progress[:num_vehicles], self.speed[:num_vehicles],
+                      self.route_id[:num_vehicles], self.lat[:num_vehicles],
+                      self.lon[:num_vehicles], self.heading[:num_vehicles],
+                      self._waypoints, self._route_starts, self._route_lens,
+                      self._route_total_km, self._cum_km, self._segment_km,
+                      self._segment_heading, float(time_step_seconds))
+        
+    def _update_positions(self) -> None:
+        """Recompute interpolated positions and headings from the fleet arrays."""
+        waypoint_index = self._route_starts[self.route_id] + self.wp_idx
+        current_waypoints = self._waypoints[waypoint_index]
+        next_waypoints = self._waypoints[waypoint_index + 1]
         
-        self.update_heading()
\ No newline at end of file
+        positions = current_waypoints + (next_waypoints - current_waypoints) * self.progress[:, None]
+        self.lat[:] = positions[:, 0]
+        self.lon[:] = positions[:, 1]
+        self.heading[:] = self._segment_heading[waypoint_index]